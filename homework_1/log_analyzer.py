@@ -1,46 +1,82 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import io
+import mmap
+import multiprocessing
 import os
 import re
 
-import gzip
 import logging
 
 import argparse
+import heapq
 import json
 import datetime
 
 import copy
 
-from statistics import median
-from string import Template
+from array import array
+from statistics import median as python_median
 
 from collections import namedtuple
 
+# isal inflates gzip with SIMD and is a drop-in replacement for the gzip module
+try:
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+
+# orjson serializes report data several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# numpy finds median with introselect in C instead of sorting python floats
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# re2 compiles the log format into a DFA, use it when it is installed
+try:
+    import re2 as nginx_re
+except ImportError:
+    nginx_re = re
+
 DEFAULT_CONFIG = {
     "REPORT_SIZE": 10,
     "REPORT_DIR": "./reports",
     "LOG_DIR": "./log",
     "LOG_FILE": None,
-    "ERRORS_LIMIT": 0.64
+    "ERRORS_LIMIT": 0.64,
+    "WORKERS": 1
 }
 
 DEFAULT_CONFIG_PATH = './config.json'
 
+READ_BUFFER_SIZE = 128 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
 FILE_NAME_REGEXP = re.compile(r"^nginx-access-ui\.log-(?P<date>\d{8})(\.gz)?$")
 
-NGINX_LOG_FORMAT_REGEXP = re.compile(
-    r'(?P<ipaddress>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+(?P<remote_user>.*?)\s+'
-    r'(?P<http_x_real_ip>.*?)\s+\[(?P<time_local>.*?)\]\s+\"(?P<request_method>.*?)\s+'
-    r'(?P<path>.*?)(?P<request_version>\s+HTTP/.*)?\"\s+(?P<status>.*?)\s+'
-    r'(?P<body_bytes_sent>.*?)\s+\"(?P<http_referer>.*?)\"\s+\"(?P<user_agent>.*?)\"\s+'
-    r'\"(?P<http_x_forwarded_for>.*?)\"\s+\"(?P<http_X_REQUEST_ID>.*?)\"\s+'
-    r'\"(?P<http_X_RB_USER>.*)\"\s+(?P<request_time>\d+\.?\d*)'
+# quoted and bracketed fields are matched with negated classes to avoid backtracking,
+# only path (group 1) and request_time (group 2) are captured
+NGINX_LOG_FORMAT_REGEXP = nginx_re.compile(
+    rb'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\s+\S*\s+\S*\s+\[[^\]]*\]\s+"[^"\s]*\s+'
+    rb'([^"]*?)(?:\s+HTTP/[^"]*)?"\s+\S*\s+\S*\s+"[^"]*"\s+"[^"]*"\s+'
+    rb'"[^"]*"\s+"[^"]*"\s+"[^"]*"\s+(\d+\.?\d*)'
 )
 
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# namedtuple for quick access for log info
+LogInfo = namedtuple('LogInfo', [
+    'file_path',
+    'date',
+])
+
 
 def setup_logging(log_file):
     """
@@ -73,25 +109,20 @@ def find_last_log_file(dir_path):
 
     last_log_info = None
 
-    # namedtuple for quick access for log info
-    LogInfo = namedtuple('LogInfo', [
-        'file_path',
-        'date',
-    ])
-
-    # try to find last log file
-    for file_name in os.listdir(dir_path):
-        match = re.match(FILE_NAME_REGEXP, file_name)
+    # try to find last log file, scandir entries know their type without extra stat calls
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            match = FILE_NAME_REGEXP.match(entry.name)
 
-        if match:
-            log_date = match.groupdict()['date']
-            try:
-                log_date = datetime.datetime.strptime(log_date, '%Y%m%d').date()
-            except ValueError:
-                continue
+            if match and entry.is_file():
+                log_date = match.group('date')
+                try:
+                    log_date = datetime.date(int(log_date[:4]), int(log_date[4:6]), int(log_date[6:]))
+                except ValueError:
+                    continue
 
-            if not last_log_info or log_date > last_log_info.date:
-                last_log_info = LogInfo(os.path.join(dir_path, file_name), log_date)
+                if not last_log_info or log_date > last_log_info.date:
+                    last_log_info = LogInfo(entry.path, log_date)
 
     return last_log_info
 
@@ -100,88 +131,338 @@ def process_line(line):
     """
     Process one line of log file.
 
-    :param line: log line
-    :type line: str
-    :return: tuple with route and request_time if line match to regexp
+    :param line: raw log line
+    :type line: bytes
+    :return: tuple with route (as bytes) and request_time if line match to log format
     :rtype: tuple or None
     """
 
+    # lines of log format start with ip address, skip blank and garbage lines at once
+    if not line or not 0x30 <= line[0] <= 0x39:
+        return None
+
+    # fast path: take request from the first quoted block after time_local
+    # and request_time from the last field of the line
+    try:
+        request = line.split(b'] "', 1)[1].split(b'"', 1)[0]
+        url, request_time = request.split()[1], line.rsplit(None, 1)[-1]
+    except IndexError:
+        pass
+    else:
+        # only plain decimal numbers are parsed here, as float() accepts nan, inf, signs and exponents
+        if request_time[:1].isdigit() and request_time.replace(b'.', b'', 1).isdigit():
+            return url, float(request_time)
+
+    # slow path for malformed lines
     result = NGINX_LOG_FORMAT_REGEXP.match(line)
     if result:
-        url, request_time = result.group('path'), float(result.group('request_time'))
+        url, request_time = result.group(1), float(result.group(2))
         return url, request_time
 
 
-def parse_log(file_path):
+def read_line_blocks(f, size=-1):
+    """
+    Read file by big chunks and return lines of one chunk at time.
+    Last incomplete line of chunk is carried over to the next one.
+
+    :param f: file opened in binary mode
+    :param size: number of bytes to read from current position, -1 to read up to the end of file
+    :type size: int
     """
-    Return one line of log at time
+
+    tail = b''
+    while size:
+        chunk = f.read(READ_CHUNK_SIZE if size < 0 else min(READ_CHUNK_SIZE, size))
+        if not chunk:
+            break
+        if size > 0:
+            size -= len(chunk)
+
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        yield lines
+
+    if tail:
+        yield [tail]
+
+
+def read_log(file_path):
+    """
+    Return block of raw log lines at time
 
     :param file_path: path to file with logs
     :type file_path: str
     """
 
-    file_open = gzip.open if file_path.endswith('.gz') else open
-    with file_open(file_path, 'rt') as f:
-        for line in f:
-            yield process_line(line)
+    if file_path.endswith('.gz'):
+        f = io.BufferedReader(gzip.open(file_path, 'rb'), buffer_size=READ_BUFFER_SIZE)
+    else:
+        f = open(file_path, 'rb', buffering=READ_BUFFER_SIZE)
 
+    with f:
+        yield from read_line_blocks(f)
 
-def calculate_statistics(file_path, log_parser, errors_limit=None):
+
+def read_log_range(file_path, start, end):
     """
-    Calculate statistics using data from file
+    Return block of raw lines of not compressed log from bytes range [start, end) at time
 
     :param file_path: path to file with logs
     :type file_path: str
-    :param log_parser: log file parser
-    :type log_parser: function
+    :param start: range start, should be a beginning of line
+    :type start: int
+    :param end: range end, should be a beginning of line or end of file
+    :type end: int
+    """
+
+    with open(file_path, 'rb', buffering=READ_BUFFER_SIZE) as f:
+        f.seek(start)
+        yield from read_line_blocks(f, end - start)
+
+
+def aggregate_lines(lines, url_ids, time_sums, time_maxes, times, parse_line):
+    """
+    Aggregate request times of log lines by url, statistics columns are updated inplace.
+    Replaced by compiled version from log_analyzer_speedups if it is built.
+
+    :param lines: raw log lines
+    :type lines: list
+    :param url_ids: url to url id dict
+    :type url_ids: dict
+    :param time_sums: time sums by url id
+    :type time_sums: array.array
+    :param time_maxes: time maxes by url id
+    :type time_maxes: array.array
+    :param times: request times arrays by url id
+    :type times: list
+    :param parse_line: line parser, returns tuple with url and request_time or None
+    :type parse_line: function
+    :return: number of processed lines
+    :rtype: int
+    """
+
+    for line in lines:
+        parsed_line = parse_line(line)
+        if parsed_line:
+            url, request_time = parsed_line
+
+            # explicit get instead of defaultdict: new url has to append all columns anyway
+            url_id = url_ids.get(url)
+            if url_id is None:
+                url_ids[url] = len(times)
+                time_sums.append(request_time)
+                time_maxes.append(request_time)
+                times.append(array('d', (request_time,)))
+            else:
+                time_sums[url_id] += request_time
+                if request_time > time_maxes[url_id]:
+                    time_maxes[url_id] = request_time
+                times[url_id].append(request_time)
+
+    return len(lines)
+
+
+# compiled aggregate_lines, build it with: cythonize -i log_analyzer_speedups.pyx
+try:
+    from log_analyzer_speedups import aggregate_lines
+except ImportError:
+    pass
+
+
+def aggregate_statistics(line_blocks):
+    """
+    Aggregate request times by url
+
+    :param line_blocks: blocks of raw log lines
+    :type line_blocks: iterable
+    :return: raw statistics, tuple with lines total, url to url id dict,
+             time sums, time maxes and request times arrays indexed by url id
+    :rtype: tuple
+    """
+
+    total = 0
+
+    # url -> id table and per-url aggregates stored column-wise by url id,
+    # count of requests is the length of times array
+    url_ids = {}
+    time_sums, time_maxes, times = array('d'), array('d'), []
+
+    for lines in line_blocks:
+        total += aggregate_lines(lines, url_ids, time_sums, time_maxes, times, process_line)
+
+    return total, url_ids, time_sums, time_maxes, times
+
+
+def merge_statistics(statistics, other_statistics):
+    """
+    Merge raw statistics of two parts of log, first statistics is updated inplace
+
+    :param statistics: raw statistics from aggregate_statistics
+    :type statistics: tuple
+    :param other_statistics: raw statistics from aggregate_statistics
+    :type other_statistics: tuple
+    :return: merged raw statistics
+    :rtype: tuple
+    """
+
+    total, url_ids, time_sums, time_maxes, times = statistics
+    other_total, other_url_ids, other_time_sums, other_time_maxes, other_times = other_statistics
+
+    for url, other_url_id in other_url_ids.items():
+        url_id = url_ids.get(url)
+        if url_id is None:
+            url_ids[url] = len(times)
+            time_sums.append(other_time_sums[other_url_id])
+            time_maxes.append(other_time_maxes[other_url_id])
+            times.append(other_times[other_url_id])
+        else:
+            time_sums[url_id] += other_time_sums[other_url_id]
+            time_maxes[url_id] = max(time_maxes[url_id], other_time_maxes[other_url_id])
+            times[url_id].extend(other_times[other_url_id])
+
+    return total + other_total, url_ids, time_sums, time_maxes, times
+
+
+NUMPY_MEDIAN_MIN_SIZE = 400
+
+
+def median(times):
+    """
+    Calculate median of request times
+
+    :param times: request times of one url
+    :type times: array
+    :return: median request time
+    :rtype: float
+    """
+
+    # numpy call has constant overhead, it pays off only for big arrays
+    if np is None or len(times) < NUMPY_MEDIAN_MIN_SIZE:
+        return python_median(times)
+
+    # frombuffer doesn't copy array('d') data
+    return float(np.median(np.frombuffer(times, dtype=np.float64)))
+
+
+def enrich_statistics(statistics, errors_limit=None):
+    """
+    Calculate statistics for html report using raw statistics
+
+    :param statistics: raw statistics from aggregate_statistics
+    :type statistics: tuple
     :param errors_limit: error percent that critical to statistics
     :type errors_limit: float
     :return: dictionary with statistics by each unique url
     :rtype: dict
     """
 
-    total = processed = processed_request_time = 0
-    statistics = {}
+    total, url_ids, time_sums, time_maxes, times = statistics
 
-    for parsed_line in log_parser(file_path):
-        total += 1
-        if parsed_line:
-            processed += 1
-            url, request_time = parsed_line
-            statistics.setdefault(url, []).append(request_time)
-            processed_request_time += request_time
+    all_count = sum(map(len, times))
+    all_time_sum = sum(time_sums)
 
-    if errors_limit is not None and total > 0 and (total - processed) / total > errors_limit:
+    if errors_limit is not None and total > 0 and (total - all_count) / total > errors_limit:
         raise Exception('Errors limit exceed')
 
-    all_count = processed
-    all_time_sum = processed_request_time
-
     # calculate enriched_ statistics for html report
     enriched_statistics = {}
-    for url, data in statistics.items():
-        count = len(data)
+    for url, url_id in url_ids.items():
+        count = len(times[url_id])
         count_perc = count / all_count
-        time_sum = sum(data)
+        time_sum = time_sums[url_id]
         time_perc = time_sum / all_time_sum
         time_avg = time_sum / count
-        time_max = max(data)
-        time_med = median(data)
+        time_max = time_maxes[url_id]
+        time_med = median(times[url_id])
 
+        # values are rounded only for rendered urls in render_template
+        url = url.decode('utf-8', errors='replace')
         enriched_statistics[url] = {
             'url': url,
             'count': count,
-            'count_perc': round(count_perc * 100, 3),
-            'time_sum': round(time_sum, 3),
-            'time_perc': round(time_perc * 100, 3),
-            'time_avg': round(time_avg, 3),
-            'time_max': round(time_max, 3),
-            'time_med': round(time_med, 3),
+            'count_perc': count_perc * 100,
+            'time_sum': time_sum,
+            'time_perc': time_perc * 100,
+            'time_avg': time_avg,
+            'time_max': time_max,
+            'time_med': time_med,
         }
 
     return enriched_statistics
 
 
+def calculate_statistics(file_path, log_parser, errors_limit=None):
+    """
+    Calculate statistics using data from file
+
+    :param file_path: path to file with logs
+    :type file_path: str
+    :param log_parser: log file reader, returns blocks of raw lines
+    :type log_parser: function
+    :param errors_limit: error percent that critical to statistics
+    :type errors_limit: float
+    :return: dictionary with statistics by each unique url
+    :rtype: dict
+    """
+
+    return enrich_statistics(aggregate_statistics(log_parser(file_path)), errors_limit)
+
+
+def aggregate_log_range(log_range):
+    """
+    Aggregate request times by url for bytes range of log, used in worker processes
+
+    :param log_range: tuple with path to file with logs, range start and range end
+    :type log_range: tuple
+    :return: raw statistics
+    :rtype: tuple
+    """
+
+    return aggregate_statistics(read_log_range(*log_range))
+
+
+def calculate_statistics_parallel(file_path, errors_limit=None, workers=None):
+    """
+    Calculate statistics using data from file, file is split into ranges
+    of lines that are parsed in separate processes.
+    Compressed files can't be split and are parsed in current process.
+
+    :param file_path: path to file with logs
+    :type file_path: str
+    :param errors_limit: error percent that critical to statistics
+    :type errors_limit: float
+    :param workers: number of worker processes, default is number of cpus
+    :type workers: int
+    :return: dictionary with statistics by each unique url
+    :rtype: dict
+    """
+
+    if file_path.endswith('.gz'):
+        return calculate_statistics(file_path, read_log, errors_limit)
+
+    workers = workers or os.cpu_count() or 1
+
+    # find ranges bounds: move each of equal offsets to the beginning of next line
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for i in range(1, workers):
+                    bound = m.find(b'\n', max(size * i // workers - 1, bounds[-1])) + 1 or size
+                    bounds.append(bound)
+    bounds.append(size)
+
+    log_ranges = [(file_path, start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+    statistics = aggregate_statistics(())
+    with multiprocessing.Pool(min(workers, len(log_ranges)) or 1) as pool:
+        for range_statistics in pool.imap_unordered(aggregate_log_range, log_ranges):
+            statistics = merge_statistics(statistics, range_statistics)
+
+    return enrich_statistics(statistics, errors_limit)
+
+
 def render_template(template_file_path, report_file_path, statistics):
     """
     Render statistics in html report using template and write it into report file
@@ -194,14 +475,27 @@ def render_template(template_file_path, report_file_path, statistics):
     :type statistics: list
     """
 
-    # open report template file and replace $table_json to our data
-    with open(template_file_path) as f:
-        s = Template(f.read())
-        s = s.safe_substitute(table_json=json.dumps(statistics))
+    statistics = [
+        {key: round(value, 3) if isinstance(value, float) else value for key, value in url_statistics.items()}
+        for url_statistics in statistics
+    ]
 
-    # write rendered report to report file
-    with open(report_file_path, 'w') as f:
-        f.write(s)
+    # open report template file and split it by $table_json placeholder
+    with open(template_file_path) as f:
+        template_parts = f.read().split('$table_json')
+
+    # write template parts to report file with our data between them,
+    # data is dumped right into the file without building whole report in memory
+    with open(report_file_path, 'w', encoding='utf-8') as f:
+        f.write(template_parts[0])
+        for template_part in template_parts[1:]:
+            if orjson is not None:
+                # orjson output is utf-8 already, it is written to binary buffer without decoding copy
+                f.flush()
+                f.buffer.write(orjson.dumps(statistics))
+            else:
+                json.dump(statistics, f, separators=(',', ':'))
+            f.write(template_part)
 
 
 def main(config):
@@ -218,24 +512,34 @@ def main(config):
         return
 
     report_file_name = 'report-{0}.html'.format(last_log_info.date.strftime('%Y.%m.%d'))
-
-    if not os.path.isdir(config['REPORT_DIR']):
-        os.makedirs(config['REPORT_DIR'])
-        logging.info("Create report directory {0} because it doesn't exist.".format(config['REPORT_DIR']))
-
     report_file_path = os.path.join(config['REPORT_DIR'], report_file_name)
     template_file_path = os.path.join(config['REPORT_DIR'], 'report.html')
 
+    # report is regenerated only if log file was changed after it
     if os.path.isfile(report_file_path):
-        logging.info('Current report is up-to-date')
-        return
+        if os.path.getmtime(report_file_path) >= os.path.getmtime(last_log_info.file_path):
+            logging.info('Current report is up-to-date')
+            return
+        logging.info('Current report is older than log file {0}'.format(last_log_info.file_path))
 
-    statistics = calculate_statistics(
-        last_log_info.file_path,
-        parse_log,
-        config['ERRORS_LIMIT']
-    )
-    top_statistics = sorted(statistics.values(), key=lambda x: x['time_sum'], reverse=True)[:config['REPORT_SIZE']]
+    if not os.path.isdir(config['REPORT_DIR']):
+        os.makedirs(config['REPORT_DIR'])
+        logging.info("Create report directory {0} because it doesn't exist.".format(config['REPORT_DIR']))
+
+    workers = config.get('WORKERS', 1)
+    if workers > 1:
+        statistics = calculate_statistics_parallel(
+            last_log_info.file_path,
+            config['ERRORS_LIMIT'],
+            workers
+        )
+    else:
+        statistics = calculate_statistics(
+            last_log_info.file_path,
+            read_log,
+            config['ERRORS_LIMIT']
+        )
+    top_statistics = heapq.nlargest(config['REPORT_SIZE'], statistics.values(), key=lambda x: x['time_sum'])
 
     if not os.path.isfile(template_file_path):
         logging.info("Template file {0} doesn't exist".format(template_file_path))
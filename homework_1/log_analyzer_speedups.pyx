@@ -0,0 +1,128 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled version of log_analyzer.aggregate_lines
+
+Build it in place with: cythonize -i log_analyzer_speedups.pyx
+"""
+
+from cpython.array cimport array, clone, resize_smart
+from cpython.conversion cimport PyOS_string_to_double
+from libc.string cimport memchr
+
+cdef array DOUBLE_ARRAY_TEMPLATE = array('d')
+
+
+cdef inline bint is_space(char c) noexcept:
+    # same whitespace as bytes.split() uses
+    return c == b' ' or b'\t' <= c <= b'\r'
+
+
+cdef bint parse_line(const char *line, Py_ssize_t size, const char **url, Py_ssize_t *url_size,
+                     double *request_time) noexcept:
+    """
+    Find url and request_time in log line the same way as log_analyzer.process_line fast path does.
+    Return False if line can't be parsed here, it should be parsed by log_analyzer.process_line then.
+    """
+
+    cdef const char *end = line + size
+    cdef const char *p = line
+    cdef const char *request_end
+    cdef const char *number_end
+    cdef char *parsed_end
+    cdef int digits = 0, dots = 0
+
+    # lines not started with ip address are left to fallback
+    if size == 0 or not b'0' <= line[0] <= b'9':
+        return False
+
+    # request is the first quoted block after time_local
+    while True:
+        p = <const char *> memchr(p, b']', end - p)
+        if p == NULL:
+            return False
+        if end - p >= 3 and p[1] == b' ' and p[2] == b'"':
+            break
+        p += 1
+
+    p += 3
+    request_end = <const char *> memchr(p, b'"', end - p)
+    if request_end == NULL:
+        request_end = end
+
+    # url is the second token of request
+    while p < request_end and is_space(p[0]):
+        p += 1
+    while p < request_end and not is_space(p[0]):
+        p += 1
+    while p < request_end and is_space(p[0]):
+        p += 1
+    if p == request_end:
+        return False
+
+    url[0] = p
+    while p < request_end and not is_space(p[0]):
+        p += 1
+    url_size[0] = p - url[0]
+
+    # request_time is the last token of line, only plain decimal numbers are parsed here
+    p = end
+    while p > line and is_space((p - 1)[0]):
+        p -= 1
+    number_end = p
+    while p > line and not is_space((p - 1)[0]):
+        p -= 1
+        if b'0' <= p[0] <= b'9':
+            digits += 1
+        elif p[0] == b'.':
+            dots += 1
+        else:
+            return False
+
+    if digits == 0 or dots > 1:
+        return False
+
+    request_time[0] = PyOS_string_to_double(p, &parsed_end, NULL)
+    return parsed_end == number_end
+
+
+def aggregate_lines(list lines, dict url_ids, array time_sums, array time_maxes, list times, parse_line_fallback):
+    """
+    Aggregate request times of log lines by url, statistics columns are updated inplace.
+    See log_analyzer.aggregate_lines for arguments description.
+    """
+
+    cdef bytes line
+    cdef const char *url
+    cdef Py_ssize_t url_size, url_id, times_size
+    cdef double request_time
+    cdef array url_times
+    cdef object url_key, url_id_obj, parsed_line
+
+    for line in lines:
+        if parse_line(line, len(line), &url, &url_size, &request_time):
+            url_key = url[:url_size]
+        else:
+            parsed_line = parse_line_fallback(line)
+            if not parsed_line:
+                continue
+            url_key, request_time = parsed_line
+
+        url_id_obj = url_ids.get(url_key)
+        if url_id_obj is None:
+            url_ids[url_key] = len(times)
+            time_sums.append(request_time)
+            time_maxes.append(request_time)
+            url_times = clone(DOUBLE_ARRAY_TEMPLATE, 1, False)
+            url_times.data.as_doubles[0] = request_time
+            times.append(url_times)
+        else:
+            url_id = url_id_obj
+            time_sums.data.as_doubles[url_id] += request_time
+            if request_time > time_maxes.data.as_doubles[url_id]:
+                time_maxes.data.as_doubles[url_id] = request_time
+            url_times = times[url_id]
+            times_size = len(url_times)
+            resize_smart(url_times, times_size + 1)
+            url_times.data.as_doubles[times_size] = request_time
+
+    return len(lines)
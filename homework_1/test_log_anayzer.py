@@ -128,6 +128,23 @@ def set_up_test_files():
     return [(k, v) for k, v in cases_dict.items()]
 
 
+class TestProcessLine(unittest.TestCase):
+
+    def test_valid_line(self):
+        line = test_log_1.splitlines()[1].encode('ascii')
+        self.assertEqual(log_analyzer.process_line(line), (b'/api1', 1.4))
+
+    def test_invalid_line(self):
+        for line in [test_log_2.splitlines()[3].encode('ascii'), b'', b'garbage']:
+            self.assertIsNone(log_analyzer.process_line(line), msg=line)
+
+    def test_not_decimal_request_time(self):
+        line = test_log_1.splitlines()[0].rsplit(None, 1)[0]
+        for request_time in ['nan', 'inf', '-1']:
+            invalid_line = '{0} {1}'.format(line, request_time).encode('ascii')
+            self.assertIsNone(log_analyzer.process_line(invalid_line), msg=invalid_line)
+
+
 class TestAnalyzer(unittest.TestCase):
 
     def setUp(self):
@@ -236,6 +253,43 @@ class TestAnalyzer(unittest.TestCase):
             msg="Not rises info msg: 'Current report is up-to-date'"
         )
 
+    def test_case_3_stale_report_regenerated(self):
+        case_name, config = self.cases[2]
+
+        # make report older than log file
+        report_file = os.path.join(config['REPORT_DIR'], 'report-2017.06.28.html')
+        os.utime(report_file, (0, 0))
+
+        # close previous log handler
+        log = logging.getLogger()
+        for hdlr in log.handlers:
+            hdlr.close()
+            log.removeHandler(hdlr)
+
+        log_analyzer.setup_logging(config['LOG_FILE'])
+        log_analyzer.main(config)
+
+        # read result from report file
+        with open(report_file) as f:
+            data = f.read()
+        data = json.loads(data.split('= ')[1][:-1])
+
+        # check that report was rendered again
+        self.assertCountEqual(
+            data,
+            test_answer_1,
+            msg="Stale report file not been regenerated"
+        )
+
+    def test_case_4_parallel_statistics_equal_to_serial(self):
+        case_name, config = self.cases[3]
+
+        file_path = os.path.join(config['LOG_DIR'], 'nginx-access-ui.log-20170628')
+        self.assertEqual(
+            log_analyzer.calculate_statistics_parallel(file_path, workers=2),
+            log_analyzer.calculate_statistics(file_path, log_analyzer.read_log),
+        )
+
     def test_case_4_rise_errors_limit_exceed(self):
         case_name, config = self.cases[3]
 
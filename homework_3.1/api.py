@@ -1,15 +1,17 @@
 import argparse
 import datetime
-import json
 import hashlib
+import hmac
 import logging
-import uuid
+import re
+import secrets
 
 from abc import ABCMeta, abstractmethod
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from store import Store, RedisStorage
 from scoring import get_interests, get_score
+from utils import json_dumps, json_loads
 
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
@@ -36,49 +38,84 @@ GENDERS = {
     FEMALE: "female",
 }
 
+DATE_REGEXP = re.compile(r'(\d{2})\.(\d{2})\.(\d{4})', re.ASCII)
+
+SALT_BYTES = SALT.encode('utf-8')
+ADMIN_SALT_BYTES = ADMIN_SALT.encode('utf-8')
+
+INT_TYPES = frozenset((int, bool))
+
+# base check errors don't depend on value, other messages are formatted only when value is invalid
+REQUIRED_ERROR = "Field is required"
+NOT_NULLABLE_ERROR = "Field must be not nullable"
+
+PHONE_MIN = 70000000000
+PHONE_MAX = 79999999999
+
+# responses with default error message are serialized once
+ERROR_RESPONSES = {code: {"error": message, "code": code} for code, message in ERRORS.items()}
+ERROR_BODIES = {code: json_dumps(r) for code, r in ERROR_RESPONSES.items()}
+
+# admin token changes once per hour, so its digest is cached as (hour, digest)
+_ADMIN_CACHE = (None, None)
+
+
+def _base_check(value, required, nullable, valid_types):
+    """
+    Check field value against rules common to all fields
+    :param value: value which we want to validate
+    :param required: field is required
+    :param nullable: field can be empty
+    :param valid_types: if it not empty, than at least for one type should be: isinstance(value, type) == True
+    :type valid_types: tuple
+    :return: error message or None if value is valid
+    """
+    # check if value is None and field is required
+    if (value is None) and (required is True):
+        return REQUIRED_ERROR
+
+    # check if value is null and field is not nullable
+    if (bool(value) is False) and (nullable is False):
+        return NOT_NULLABLE_ERROR
+
+    # check if field type in valid_type
+    if value is not None and valid_types and not isinstance(value, valid_types):
+        return f"Field must be in {valid_types}. Your type is: {type(value)}"
+
 
 class BaseField(metaclass=ABCMeta):
     """
     Base abstract class for field validating
     """
 
+    # if it is not empty, than at least for one type should be: isinstance(value, type) == True
+    valid_types = ()
+
     def __init__(self, required=False, nullable=False):
 
         self.required = required
         self.nullable = nullable
         self.name = None
+        # name of request slot where value is stored, set by MetaRequest
+        self._attr = None
 
     def __get__(self, inst, cls):
 
         if inst is None:
             return self
         else:
-            return inst.__dict__.get('_' + self.name, None)
+            return getattr(inst, self._attr, None)
 
     def __set__(self, inst, value):
-        inst.__dict__['_' + self.name] = value
+        setattr(inst, self._attr, value)
 
     @abstractmethod
-    def validate(self, value, valid_type_list=()):
+    def validate(self, value):
         """
-        Validate field value
+        Validate field value, implementations call _base_check directly instead of super().validate
         :param value: value which we want to validate
-        :param valid_type_list: if it not empty, than at least for one type should be: isinstance(value, type) == True
-        :type valid_type_list: tuple
+        :return: error message or None if value is valid
         """
-        # check if value is None and field is required
-        if (value is None) and (self.required is True):
-            raise ValueError(f"Field is required: '{value}'")
-
-        # check if value is null and field is not nullable
-        if (bool(value) is False) and (self.nullable is False):
-            raise ValueError(f"Field must be not nullable: '{value}'")
-
-        # check if field type in valid_type
-        if value is not None:
-            checked_valid_type = [isinstance(value, _type) for _type in valid_type_list]
-            if len(checked_valid_type) != 0 and sum(checked_valid_type) == 0:
-                raise TypeError(f"Field must be in {valid_type_list}. Your type is: {type(value)}")
 
     def is_valid(self, value):
         """
@@ -87,14 +124,10 @@ class BaseField(metaclass=ABCMeta):
         :param value: field value which we want to validate
         """
 
-        try:
-            self.validate(value)
-        except Exception as e:
-            error_msg = repr(e)
-        else:
-            error_msg = ''
+        # errors are returned instead of raised, so valid values never build exceptions
+        error_msg = self.validate(value)
 
-        return not error_msg, error_msg
+        return error_msg is None, error_msg or ''
 
 
 class CharBaseField(BaseField):
@@ -105,8 +138,12 @@ class CharBaseField(BaseField):
     * be instance of str
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value, valid_type_list=(str,))
+    valid_types = (str,)
+
+    def validate(self, value):
+        # non-empty str passes all base checks
+        if type(value) is not str or not value:
+            return _base_check(value, self.required, self.nullable, self.valid_types)
 
 
 class PhoneBaseField(BaseField):
@@ -118,14 +155,22 @@ class PhoneBaseField(BaseField):
     * start with 7
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value, valid_type_list=(str, int))
+    valid_types = (str, int)
+
+    def validate(self, value):
+        error_msg = _base_check(value, self.required, self.nullable, self.valid_types)
+        if error_msg is not None:
+            return error_msg
 
-        # check that value looks like phone number
-        if value and not str(value).startswith("7"):
-            raise ValueError(f"Not correct phone number, should start with 7: '{value}'")
-        if value and not len(str(value)) == 11:
-            raise ValueError(f"Not correct phone number, should be 11 digits: '{value}'")
+        # check that value looks like phone number without converting integers to str
+        if value:
+            if isinstance(value, int):
+                is_phone_valid = PHONE_MIN <= value <= PHONE_MAX
+            else:
+                is_phone_valid = len(value) == 11 and value[0] == '7' and value.isascii() and value.isdigit()
+
+            if not is_phone_valid:
+                return f"Not correct phone number, should be 11 digits and start with 7: '{value}'"
 
 
 class EmailField(CharBaseField):
@@ -136,12 +181,15 @@ class EmailField(CharBaseField):
     * contain '@' symbol
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value)
+    def validate(self, value):
+        if type(value) is not str or not value:
+            error_msg = _base_check(value, self.required, self.nullable, self.valid_types)
+            if error_msg is not None or not value:
+                return error_msg
 
         # validate email
-        if value and '@' not in value:
-            raise ValueError(f"Not correct email address, email should contain '@' symbol: '{value}'")
+        if '@' not in value:
+            return f"Not correct email address, email should contain '@' symbol: '{value}'"
 
 
 class DateField(CharBaseField):
@@ -152,20 +200,32 @@ class DateField(CharBaseField):
     * match to 'DD.MM.YYYY' format
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value)
+    def validate(self, value):
+        if type(value) is not str or not value:
+            error_msg = _base_check(value, self.required, self.nullable, self.valid_types)
+            if error_msg is not None or not value:
+                return error_msg
 
         # check that value is in right date format
-        if value:
-            try:
-                datetime.datetime.strptime(value, '%d.%m.%Y')
-            except ValueError:
-                is_date_valid = False
-            else:
-                is_date_valid = True
+        match = DATE_REGEXP.fullmatch(value)
+        if not match:
+            return f"Incorrect date format, should be 'DD.MM.YYYY': {value}"
 
-            if not is_date_valid:
-                raise ValueError(f"Incorrect date format, should be 'DD.MM.YYYY': {value}")
+        day, month, year = map(int, match.groups())
+        try:
+            date = datetime.date(year, month, day)
+        except ValueError:
+            return f"Incorrect date format, should be 'DD.MM.YYYY': {value}"
+
+        return self.validate_date(date)
+
+    def validate_date(self, date):
+        """
+        Validate parsed date, subclasses use it to avoid parsing value again
+        :param date: parsed field value
+        :type date: datetime.date
+        :return: error message or None if date is valid
+        """
 
 
 class BirthDayField(DateField):
@@ -176,19 +236,15 @@ class BirthDayField(DateField):
     * be less then 70 years and greater than 0
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value)
+    def validate_date(self, date):
 
         # check birthday
-        if value:
-            birthday_datetime = datetime.datetime.strptime(value, '%d.%m.%Y')
-            current_datetime = datetime.datetime.now()
-            age_in_years = (current_datetime - birthday_datetime).days / 365
-            is_birthday_valid = (0 <= age_in_years <= 70)
+        age_in_years = (datetime.date.today() - date).days / 365
+        is_birthday_valid = (0 <= age_in_years <= 70)
 
-            if not is_birthday_valid:
-                raise ValueError(f"Incorrect birthday date, should be not greater than 70 "
-                                 f"and greater than 0: {age_in_years}")
+        if not is_birthday_valid:
+            return (f"Incorrect birthday date, should be not greater than 70 "
+                    f"and greater than 0: {age_in_years}")
 
 
 class GenderBaseField(BaseField):
@@ -200,12 +256,16 @@ class GenderBaseField(BaseField):
     * be in [0, 1, 2]: unknown - 0, male - 1, female - 2
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value, valid_type_list=(int,))
+    valid_types = (int,)
 
-        # check gender values
-        if value and value not in GENDERS:
-            raise ValueError(f"Incorrect gender, should be in [0, 1, 2]: {value}")
+    def validate(self, value):
+        error_msg = _base_check(value, self.required, self.nullable, self.valid_types)
+        if error_msg is not None:
+            return error_msg
+
+        # check gender values, genders are consecutive integers
+        if value and not UNKNOWN <= value <= FEMALE:
+            return f"Incorrect gender, should be in [0, 1, 2]: {value}"
 
 
 class ArgumentsBaseField(BaseField):
@@ -216,8 +276,10 @@ class ArgumentsBaseField(BaseField):
     * be instance of dict
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value, valid_type_list=(dict,))
+    valid_types = (dict,)
+
+    def validate(self, value):
+        return _base_check(value, self.required, self.nullable, self.valid_types)
 
 
 class ClientIDsBaseField(BaseField):
@@ -228,47 +290,89 @@ class ClientIDsBaseField(BaseField):
     * be array of integers
     """
 
-    def validate(self, value, valid_type=()):
-        super().validate(value, valid_type_list=(list, tuple))
+    valid_types = (list, tuple)
+
+    def validate(self, value):
+        error_msg = _base_check(value, self.required, self.nullable, self.valid_types)
+        if error_msg is not None:
+            return error_msg
+
+        # check that all values in array is integers, element types are compared in C
+        # and isinstance loop is left only for int subclasses
+        if value and not INT_TYPES.issuperset(map(type, value)) and not all(isinstance(v, int) for v in value):
+            return f"Incorrect client_ids, should be list of integers: {value}"
+
+
+def _make_request_init(fields):
+    """
+    Generate request __init__ which assigns all field slots with straight-line code,
+    filled (not empty) fields are marked by bits of _filled mask in fields order
+    """
+    lines = ['def __init__(self, request):', '    self.errors = []', '    filled = 0']
+    for i, field_name in enumerate(fields):
+        lines.extend([
+            f'    self._{field_name} = value = request.get({field_name!r})',
+            f'    if value:',
+            f'        filled |= {1 << i}',
+        ])
+    lines.extend(['    self._filled = filled', '    self.validate()'])
 
-        # check that all values in array is integers
-        if value and not all(isinstance(v, int) for v in value):
-            raise ValueError(f"Incorrect client_ids, should be list of integers: {value}")
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    return namespace['__init__']
+
+
+def _make_validate_fields(fields):
+    """
+    Generate request _validate_fields which calls validator of each field with straight-line code
+    """
+    lines = ['def _validate_fields(self):', '    errors = self.errors']
+    namespace = {}
+    for field_name, field in fields.items():
+        # bound is_valid methods are resolved once per class instead of once per request
+        namespace[f'{field_name}_is_valid'] = field.is_valid
+        lines.extend([
+            f'    is_valid, error_msg = {field_name}_is_valid(self._{field_name})',
+            f'    if not is_valid:',
+            f'        errors.append(f"{field_name} field is incorrect: {{error_msg}}")',
+        ])
+
+    exec('\n'.join(lines), namespace)
+    return namespace['_validate_fields']
 
 
 class MetaRequest(type):
 
     def __new__(mcs, name, bases, attrs):
 
-        fields = []
+        fields = {}
         for field_name, field in attrs.items():
             if isinstance(field, BaseField):
                 field.name = field_name
-                fields.append(field_name)
-        attrs['fields'] = fields
+                field._attr = '_' + field_name
+                fields[field_name] = field
+        attrs['fields'] = tuple(fields)
+        # field values are stored in slots instead of instance dict
+        attrs.setdefault('__slots__', tuple(f'_{field_name}' for field_name in fields))
+        # per class code is generated instead of looping over fields on each request
+        attrs['__init__'] = _make_request_init(fields)
+        attrs['_validate_fields'] = _make_validate_fields(fields)
 
         return super().__new__(mcs, name, bases, attrs)
 
 
 class BaseRequest(metaclass=MetaRequest):
+    """
+    Base request class, __init__ is generated by MetaRequest for each request class
+    """
 
-    def __init__(self, request):
-
-        self.errors = []
-        for field_name in self.fields:
-            field_value = request.get(field_name, None)
-            setattr(self, field_name, field_value)
-        self.validate()
+    __slots__ = ('errors', '_filled')
 
     def validate(self):
+        self._validate_fields()
 
-        for field_name in self.fields:
-
-            field_value = getattr(self, field_name, None)
-            is_valid, error_msg = getattr(self.__class__, field_name).is_valid(field_value)
-
-            if not is_valid:
-                self.errors.append(f"{field_name} field is incorrect: {error_msg}")
+    def get_filled_fields(self):
+        return [field_name for i, field_name in enumerate(self.fields) if self._filled >> i & 1]
 
     def is_valid(self):
         return not self.errors, '\n'.join(self.errors)
@@ -284,9 +388,8 @@ class ClientsInterestsRequest(BaseRequest):
 
     def get_response(self, store, context, is_admin):
 
-        result = {}
-        for cid in self.client_ids:
-            result[str(cid)] = get_interests(store, cid)
+        interests = get_interests(store, self.client_ids)
+        result = {str(cid): cid_interests for cid, cid_interests in zip(self.client_ids, interests)}
 
         context["nclients"] = len(self.client_ids)
 
@@ -305,19 +408,18 @@ class OnlineScoreRequest(BaseRequest):
     birthday = BirthDayField(required=False, nullable=True)
     gender = GenderBaseField(required=False, nullable=True)
 
-    needed_pairs = [
-        ['phone', 'email'],
-        ['first_name', 'last_name'],
-        ['gender', 'birthday']
-    ]
+    needed_pairs = (
+        ('phone', 'email'),
+        ('first_name', 'last_name'),
+        ('gender', 'birthday'),
+    )
 
     def validate(self):
         super().validate()
-        is_anyone_pair_is_not_nullable = False
-        for field_name_1, field_name_2 in self.needed_pairs:
-
-            if getattr(self, field_name_1) is not None and getattr(self, field_name_2) is not None:
-                is_anyone_pair_is_not_nullable = True
+        is_anyone_pair_is_not_nullable = any(
+            getattr(self, field_name_1) is not None and getattr(self, field_name_2) is not None
+            for field_name_1, field_name_2 in self.needed_pairs
+        )
 
         if not is_anyone_pair_is_not_nullable:
             self.errors.append('OnlineScoreRequest: there is no required pair of values')
@@ -337,12 +439,7 @@ class OnlineScoreRequest(BaseRequest):
                 self.last_name,
             )
 
-        filled_field_names = [
-            field_name
-            for field_name in self.fields
-            if getattr(self, field_name, None)
-        ]
-        context["has"] = ", ".join(filled_field_names)
+        context["has"] = ", ".join(self.get_filled_fields())
 
         return {"score": result}
 
@@ -403,28 +500,39 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
     store = Store(RedisStorage())
 
     def get_request_id(self, headers):
-        return headers.get('HTTP_X_REQUEST_ID', uuid.uuid4().hex)
+        # random id is generated only if client didn't send one
+        return headers.get('HTTP_X_REQUEST_ID') or secrets.token_hex(16)
+
+    def read_body(self, length):
+        """
+        Read request body, negative Content-Length is rejected
+        """
+        if length < 0:
+            raise ValueError(f"Incorrect Content-Length: {length}")
+
+        return self.rfile.read(length)
 
     def do_POST(self):
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
         request = None
-        data_string = ''
 
         try:
-            data_string = self.rfile.read(int(self.headers['Content-Length']))
-            request = json.loads(data_string)
+            data = self.read_body(int(self.headers['Content-Length']))
+            request = json_loads(data)
         except:
             code = BAD_REQUEST
 
         if request:
             path = self.path.strip("/")
-            logging.info("%s: %s %s" % (self.path, data_string, context["request_id"]))
+            # messages are formatted by logging only if record is emitted, body is logged only in debug
+            logging.info("%s: %s", self.path, context["request_id"])
+            logging.debug("%s: %r %s", self.path, request, context["request_id"])
             if path in self.router:
                 try:
                     response, code = self.router[path]({"body": request, "headers": self.headers}, context, self.store)
                 except Exception as e:
-                    logging.exception("Unexpected error: %s" % e)
+                    logging.exception("Unexpected error: %s", e)
                     code = INTERNAL_ERROR
             else:
                 code = NOT_FOUND
@@ -434,26 +542,56 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
         self.end_headers()
         if code not in ERRORS:
             r = {"response": response, "code": code}
+            body = json_dumps(r)
+        elif response and response != ERRORS[code]:
+            r = {"error": response, "code": code}
+            body = json_dumps(r)
         else:
-            r = {"error": response or ERRORS.get(code, "Unknown Error"), "code": code}
+            r = ERROR_RESPONSES[code]
+            body = ERROR_BODIES[code]
         context.update(r)
         logging.info(context)
-        self.wfile.write(json.dumps(r).encode())
+        self.wfile.write(body)
         return
 
 
+def get_admin_digest():
+    """
+    Get admin token digest for current hour, it is recalculated only when hour changes
+    """
+    global _ADMIN_CACHE
+
+    # hour is compared as tuple, so strftime is called only when digest is recalculated
+    now = datetime.datetime.now()
+    hour = (now.year, now.month, now.day, now.hour)
+    cached_hour, digest = _ADMIN_CACHE
+    if cached_hour != hour:
+        h = hashlib.sha512(now.strftime("%Y%m%d%H").encode('utf-8'))
+        h.update(ADMIN_SALT_BYTES)
+        digest = h.digest()
+        _ADMIN_CACHE = (hour, digest)
+
+    return digest
+
+
 def check_auth(request):
 
     if request.is_admin():
-        msg = datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT
+        digest = get_admin_digest()
     else:
-        msg = request.account + request.login + SALT
+        # message parts are fed to hasher one by one without building joined string
+        h = hashlib.sha512((request.account or "").encode('utf-8'))
+        h.update(request.login.encode('utf-8'))
+        h.update(SALT_BYTES)
+        digest = h.digest()
 
-    digest = hashlib.sha512(msg.encode('utf-8')).hexdigest()
+    # raw digests are compared in constant time, token that is not hex is invalid
+    try:
+        token = bytes.fromhex(request.token)
+    except (TypeError, ValueError):
+        return False
 
-    if digest == request.token:
-        return True
-    return False
+    return hmac.compare_digest(digest, token)
 
 
 if __name__ == "__main__":
@@ -466,7 +604,7 @@ if __name__ == "__main__":
     logging.basicConfig(filename=args.log, level=logging.INFO,
                         format='[%(asctime)s] %(levelname).1s %(message)s', datefmt='%Y.%m.%d %H:%M:%S')
 
-    server = HTTPServer(("localhost", args.port), MainHTTPHandler)
+    server = ThreadingHTTPServer(("localhost", args.port), MainHTTPHandler)
     logging.info(f"Starting server at {args.port}")
 
     try:
@@ -1,24 +1,34 @@
 import hashlib
 import random
-import json
+
+from utils import json_loads
+
+KEY_PREFIX = b"uid:"
 
 
 def get_score(store, phone, email, birthday=None, gender=None, first_name=None, last_name=None):
     """
     Get user's score based on given user fields
     """
-    key_parts = [
-        first_name or "",
-        last_name or "",
-        str(phone) or "",
-        birthday if birthday else "",
-    ]
-    key = "uid:" + hashlib.md5("".join(key_parts).encode('utf-8')).hexdigest()
+    # without key parts all users would share one cache key
+    key = None
+    if first_name or last_name or phone or birthday:
+        # key parts are hashed one by one without building joined string,
+        # digest is the same as md5 of joined parts
+        h = hashlib.md5()
+        for key_part in (first_name, last_name, phone, birthday):
+            if key_part:
+                h.update(str(key_part).encode('utf-8'))
+        # redis keys are binary safe, so raw digest is used without hex encoding
+        key = KEY_PREFIX + h.digest()
 
     # get value from cache
-    score = store.cache_get(key) or 0
-    if score:
-        return float(score)
+    if key:
+        cached_score = store.cache_get(key)
+        if cached_score:
+            return float(cached_score)
+
+    score = 0
 
     if phone:
         score += 1.5
@@ -29,15 +39,16 @@ def get_score(store, phone, email, birthday=None, gender=None, first_name=None,
     if first_name and last_name:
         score += 0.5
 
-    # set value to cache
-    store.cache_set(key, score, 60 * 60)
+    # set value to cache, zero score is not cached as it is cheap to calculate
+    if key and score:
+        store.cache_set(key, score, 60 * 60)
 
     return score
 
 
-def get_interests(store, cid):
+def get_interests(store, cids):
     """
-    Get user interests
+    Get interests of several users with one storage request
     """
-    r = store.get("i:%s" % cid)
-    return json.loads(r) if r else []
+    values = store.get_many(["i:%s" % cid for cid in cids])
+    return [json_loads(r) if r else [] for r in values]
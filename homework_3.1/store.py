@@ -1,6 +1,29 @@
 import redis
 from utils import retry
 
+MAX_CONNECTIONS = 32
+
+# connection pools are shared by all storages with the same connection settings
+_POOLS = {}
+
+
+def get_connection_pool(host, port, timeout):
+    key = (host, port, timeout)
+    pool = _POOLS.get(key)
+    if pool is None:
+        # threads wait for a free connection instead of failing when all of them are busy
+        pool = _POOLS.setdefault(key, redis.BlockingConnectionPool(
+            host=host,
+            port=port,
+            socket_connect_timeout=timeout,
+            socket_timeout=timeout,
+            max_connections=MAX_CONNECTIONS,
+            timeout=timeout,
+            # values are json and numbers, so they are returned as str
+            decode_responses=True
+        ))
+    return pool
+
 
 class RedisStorage:
 
@@ -8,25 +31,26 @@ class RedisStorage:
         self.host = host
         self.port = port
         self.timeout = timeout
-        self.conn = redis.Redis(
-            host=self.host,
-            port=self.port,
-            socket_connect_timeout=self.timeout,
-            socket_timeout=self.timeout
-        )
+        self.conn = redis.Redis(connection_pool=get_connection_pool(self.host, self.port, self.timeout))
 
     def get(self, key):
         try:
             value = self.conn.get(key)
             return value
-        except (redis.exceptions.TimeoutError, redis.RedisError):
-            raise ConnectionError
+        except (redis.exceptions.TimeoutError, redis.RedisError) as e:
+            raise ConnectionError(e) from e
+
+    def mget(self, keys):
+        try:
+            return self.conn.mget(keys)
+        except (redis.exceptions.TimeoutError, redis.RedisError) as e:
+            raise ConnectionError(e) from e
 
     def set(self, key, value, expires=0):
         try:
             return self.conn.set(key, value, ex=expires)
-        except (redis.exceptions.TimeoutError, redis.exceptions.ConnectionError):
-            raise ConnectionError
+        except (redis.exceptions.TimeoutError, redis.RedisError) as e:
+            raise ConnectionError(e) from e
 
 
 class Store:
@@ -40,11 +64,16 @@ class Store:
     def get(self, key):
         return self.storage.get(key)
 
-    @retry(max_retries=max_retries, silent=True)
+    @retry(max_retries=max_retries, silent=False)
+    def get_many(self, keys):
+        return self.storage.mget(keys)
+
+    # cache fails open: it is tried once and errors are ignored
+    @retry(max_retries=1, silent=True)
     def cache_get(self, key):
         return self.storage.get(key)
 
-    @retry(max_retries=max_retries, silent=True)
+    @retry(max_retries=1, silent=True)
     def cache_set(self, key, value, expires=0):
         return self.storage.set(key, value, expires)
 
@@ -33,6 +33,7 @@ class TestSuite(unittest.TestCase):
         {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "token": "", "arguments": {}},
         {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "token": "sdd", "arguments": {}},
         {"account": "horns&hoofs", "login": "admin", "method": "online_score", "token": "", "arguments": {}},
+        {"login": "h&f", "method": "online_score", "token": "sdd", "arguments": {}},
     ])
     def test_bad_auth(self, request):
         _, code = self.get_response(request)
@@ -90,6 +91,8 @@ class TestSuite(unittest.TestCase):
         self.assertEqual(api.OK, code, arguments)
         score = response.get("score")
         self.assertTrue(isinstance(score, (int, float)) and score >= 0, arguments)
+        filled_field_names = [field_name for field_name, value in arguments.items() if value]
+        self.assertCountEqual(self.context["has"].split(", "), filled_field_names, arguments)
 
     def test_ok_score_admin_request(self):
         arguments = {"phone": "79175002040", "email": "stupnikov@otus.ru"}
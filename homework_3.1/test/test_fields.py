@@ -4,6 +4,11 @@ import api
 from test.utils import cases
 
 
+# str subclass should be validated the same way as str
+class Str(str):
+    pass
+
+
 class TestCharBaseField(unittest.TestCase):
 
     def setUp(self):
@@ -16,7 +21,8 @@ class TestCharBaseField(unittest.TestCase):
 
     @cases([12312, {}, []])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestPhoneBaseField(unittest.TestCase):
@@ -29,14 +35,15 @@ class TestPhoneBaseField(unittest.TestCase):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertTrue(is_valid)
 
-    @cases(['+7123456789', 7123456789, 81234567890, 'abd'])
+    @cases(['+7123456789', 7123456789, 81234567890, 'abd', '7123456789a', 712345678901, True])
     def test_invalid_value(self, value):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertFalse(is_valid)
 
     @cases([{}, [], 1.1])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestEmailField(unittest.TestCase):
@@ -44,19 +51,20 @@ class TestEmailField(unittest.TestCase):
     def setUp(self):
         self.field = api.EmailField(required=False, nullable=True)
 
-    @cases(['@', 'some@email.com', '', None])
+    @cases(['@', 'some@email.com', '', None, Str('some@email.com')])
     def test_valid_value(self, value):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertTrue(is_valid, value)
 
-    @cases(['some_email.com', '1asd1'])
+    @cases(['some_email.com', '1asd1', Str('some_email.com')])
     def test_invalid_value(self, value):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertFalse(is_valid)
 
     @cases([{}, [], 3])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestDateField(unittest.TestCase):
@@ -69,14 +77,15 @@ class TestDateField(unittest.TestCase):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertTrue(is_valid, value)
 
-    @cases(['1990.03.24', '03.24.1990'])
+    @cases(['1990.03.24', '03.24.1990', '31.02.2000', '1.1.2000', '24.03.1990\n', Str('garbage')])
     def test_invalid_value(self, value):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertFalse(is_valid)
 
     @cases([{}, [], 3])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestBirthDayField(unittest.TestCase):
@@ -89,14 +98,15 @@ class TestBirthDayField(unittest.TestCase):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertTrue(is_valid, value)
 
-    @cases(['1990.03.24', '03.24.1990'])
+    @cases(['1990.03.24', '03.24.1990', '31.02.2000', '01.01.1890', Str('01.01.1800')])
     def test_invalid_value(self, value):
         is_valid, errors_msg = self.field.is_valid(value)
         self.assertFalse(is_valid)
 
     @cases([{}, [], 3])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestGenderBaseField(unittest.TestCase):
@@ -116,7 +126,8 @@ class TestGenderBaseField(unittest.TestCase):
 
     @cases([{}, [], 3.1, 'some test'])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestArgumentsBaseField(unittest.TestCase):
@@ -131,7 +142,8 @@ class TestArgumentsBaseField(unittest.TestCase):
 
     @cases([[], 3, 'test'])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
 
 class TestClientIDsBaseField(unittest.TestCase):
@@ -151,8 +163,10 @@ class TestClientIDsBaseField(unittest.TestCase):
 
     @cases([3.1, 'some test'])
     def test_invalid_type(self, value):
-        self.assertRaises(TypeError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be in'), value)
 
     @cases([[]])
     def test_empty_value(self, value):
-        self.assertRaises(ValueError, self.field.validate, value)
+        error_msg = self.field.validate(value)
+        self.assertTrue(error_msg and error_msg.startswith('Field must be not nullable'), value)
@@ -12,13 +12,13 @@ class TestStore(unittest.TestCase):
     @cases([('key_0', 0), ('key_1', 1), ('key_2', 2)])
     def test_store_set_cache_get(self, key, value):
         self.store.cache_set(key, value, 1)
-        cache_value = self.store.cache_get(key).decode('utf-8')
+        cache_value = self.store.cache_get(key)
         self.assertEqual(cache_value, str(value))
 
     @cases([('key_3', 0), ('key_4', 1), ('key_5', 2)])
     def test_store_set_get(self, key, value):
         self.store.cache_set(key, value, 1)
-        cache_value = self.store.get(key).decode('utf-8')
+        cache_value = self.store.get(key)
         self.assertEqual(cache_value, str(value))
 
     def test_cache_get_and_set_not_raise_connection_error(self):
@@ -33,3 +33,9 @@ class TestStore(unittest.TestCase):
         store = Store(RedisStorage(port=6378))
         # try to get value in not working storage
         self.assertRaises(ConnectionError, store.get, 'key_0')
+
+    def test_get_many_raise_connection_error(self):
+        # create store with incorrect port for redis
+        store = Store(RedisStorage(port=6378))
+        # try to get several values in not working storage
+        self.assertRaises(ConnectionError, store.get_many, ['key_0', 'key_1'])
@@ -2,12 +2,16 @@ import functools
 
 
 def cases(cases):
+    # cases are normalized to argument tuples once, when test is decorated
+    cases = [c if isinstance(c, tuple) else (c,) for c in cases]
+
     def decorator(f):
         @functools.wraps(f)
         def wrapper(*args):
+            # every case runs in its own subTest, so failed case doesn't hide the next ones
             for c in cases:
-                new_args = args + (c if isinstance(c, tuple) else (c,))
-                f(*new_args)
+                with args[0].subTest(case=c if len(c) != 1 else c[0]):
+                    f(*args, *c)
         return wrapper
     return decorator
 
@@ -20,6 +24,9 @@ class MockStore:
     def get(self, key):
         return self.storage.get(key, None)
 
+    def get_many(self, keys):
+        return [self.storage.get(key, None) for key in keys]
+
     def cache_get(self, key):
         return self.storage.get(key, None)
 
@@ -1,17 +1,44 @@
 import functools
+import json
+import random
 import time
 
+# orjson parses and serializes json several times faster than json, use it when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def retry(max_retries=3, silent=True):
+
+if orjson is not None:
+    def json_loads(s):
+        return orjson.loads(s)
+
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def json_loads(s):
+        return json.loads(s)
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+
+def retry(max_retries=3, silent=True, exceptions=(ConnectionError,), base_delay=0.01, max_delay=0.1):
     def decorator(f):
         @functools.wraps(f)
         def wrapper(*args, **kwargs):
+            error = None
             for attempt in range(max_retries):
                 try:
                     return f(*args, **kwargs)
-                except ConnectionError:
-                    time.sleep(1)
+                except exceptions as e:
+                    error = e
+                    # exponential backoff with jitter, so retrying clients don't hit storage at once,
+                    # there is nothing to wait for after the last attempt
+                    if attempt < max_retries - 1:
+                        time.sleep(min(base_delay * 2 ** attempt + random.random() * base_delay / 2, max_delay))
             if not silent:
-                raise ConnectionError
+                raise ConnectionError(f"{f.__name__} failed after {max_retries} attempts") from error
         return wrapper
     return decorator
@@ -2,13 +2,22 @@ import argparse
 import datetime
 import json
 import hashlib
+import hmac
 import logging
-import uuid
+import re
+import secrets
+import threading
 
 from abc import ABCMeta, abstractmethod
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from scoring import get_interests, get_score
 
+# orjson parses and serializes json several times faster than json, use it when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
 ADMIN_SALT = "42"
@@ -34,12 +43,51 @@ GENDERS = {
     FEMALE: "female",
 }
 
+PHONE_MIN = 70000000000
+PHONE_MAX = 79999999999
+EMAIL_REGEXP = re.compile(r'[^@\s]+@[^@\s]+')
+DATE_REGEXP = re.compile(r'(\d{2})\.(\d{2})\.(\d{4})', re.ASCII)
+
+SALT_BYTES = SALT.encode('utf-8')
+ADMIN_SALT_BYTES = ADMIN_SALT.encode('utf-8')
+
+if orjson is not None:
+    def json_loads(s):
+        return orjson.loads(s)
+
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def json_loads(s):
+        return json.loads(s)
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+MAX_BODY_SIZE = 1 << 20
+
+# admin token changes once per hour, so its digest is cached as (hour, digest)
+_ADMIN_CACHE = (None, None)
+
+# current date is taken once per request in do_POST
+_request_local = threading.local()
+
+# validation results of repeated field values, cache is cleared when it is full
+VALIDATION_CACHE_SIZE = 2048
+# only scalars and short strings are cached, key of container costs as much as its validation
+VALIDATION_CACHE_TYPES = frozenset((type(None), bool, int, float, str))
+VALIDATION_CACHE_MAX_LENGTH = 64
+_validation_cache = {}
+
 
 class BaseField(metaclass=ABCMeta):
     """
     Base abstract class for field validating
     """
 
+    # fields which validation depends on anything except value shouldn't be cached
+    cacheable = True
+
     def __init__(self, required=False, nullable=False):
 
         self.required = required
@@ -78,6 +126,25 @@ class BaseField(metaclass=ABCMeta):
             if len(checked_valid_type) != 0 and sum(checked_valid_type) == 0:
                 raise TypeError(f"Field must be in {valid_type_list}. Your type is: {type(value)}")
 
+    def get_cache_key(self, value):
+        """
+        Get validation cache key of value or None if value can't be cached
+
+        :param value: field value which we want to validate
+        """
+
+        if not self.cacheable:
+            return None
+
+        value_type = type(value)
+        if value_type not in VALIDATION_CACHE_TYPES:
+            return None
+        if value_type is str and len(value) > VALIDATION_CACHE_MAX_LENGTH:
+            return None
+
+        # value type is a part of key, as True and 1 are equal but validated differently
+        return type(self), self.required, self.nullable, value_type, value
+
     def is_valid(self, value):
         """
         Check that field value is valid
@@ -85,6 +152,12 @@ class BaseField(metaclass=ABCMeta):
         :param value: field value which we want to validate
         """
 
+        key = self.get_cache_key(value)
+        if key is not None:
+            result = _validation_cache.get(key)
+            if result is not None:
+                return result
+
         try:
             self.validate(value)
         except Exception as e:
@@ -92,7 +165,14 @@ class BaseField(metaclass=ABCMeta):
         else:
             error_msg = ''
 
-        return not error_msg, error_msg
+        result = not error_msg, error_msg
+
+        if key is not None:
+            if len(_validation_cache) >= VALIDATION_CACHE_SIZE:
+                _validation_cache.clear()
+            _validation_cache[key] = result
+
+        return result
 
 
 class CharBaseField(BaseField):
@@ -119,11 +199,15 @@ class PhoneBaseField(BaseField):
     def validate(self, value, valid_type_list=()):
         super().validate(value, valid_type_list=(str, int))
 
-        # check that value looks like phone number
-        if value and not str(value).startswith("7"):
-            raise ValueError(f"Not correct phone number, should start with 7: '{value}'")
-        if value and not len(str(value)) == 11:
-            raise ValueError(f"Not correct phone number, should be 11 digits: '{value}'")
+        # check that value looks like phone number without converting integers to str
+        if value:
+            if isinstance(value, int):
+                is_phone_valid = PHONE_MIN <= value <= PHONE_MAX
+            else:
+                is_phone_valid = len(value) == 11 and value[0] == '7' and value.isascii() and value.isdigit()
+
+            if not is_phone_valid:
+                raise ValueError(f"Not correct phone number, should be 11 digits and start with 7: '{value}'")
 
 
 class EmailField(CharBaseField):
@@ -131,15 +215,15 @@ class EmailField(CharBaseField):
     Validate email field
     Email field value should:
     * be char field
-    * contain '@' symbol
+    * contain one '@' symbol between non-empty parts without spaces
     """
 
     def validate(self, value, valid_type_list=()):
         super().validate(value)
 
         # validate email
-        if value and '@' not in value:
-            raise ValueError(f"Not correct email address, email should contain '@' symbol: '{value}'")
+        if value and not EMAIL_REGEXP.fullmatch(value):
+            raise ValueError(f"Not correct email address, email should contain one '@' symbol: '{value}'")
 
 
 class DateField(CharBaseField):
@@ -155,38 +239,47 @@ class DateField(CharBaseField):
 
         # check that value is in right date format
         if value:
+            match = DATE_REGEXP.fullmatch(value)
+            if not match:
+                raise ValueError(f"Incorrect date format, should be 'DD.MM.YYYY': {value}")
+
+            day, month, year = map(int, match.groups())
             try:
-                datetime.datetime.strptime(value, '%d.%m.%Y')
+                date = datetime.date(year, month, day)
             except ValueError:
-                is_date_valid = False
-            else:
-                is_date_valid = True
-
-            if not is_date_valid:
                 raise ValueError(f"Incorrect date format, should be 'DD.MM.YYYY': {value}")
 
+            self.validate_date(date)
+
+    def validate_date(self, date):
+        """
+        Validate parsed date, subclasses use it to avoid parsing value again
+        :param date: parsed field value
+        :type date: datetime.date
+        """
+
 
 class BirthDayField(DateField):
     """
     Validate birthday field
     Birthday field value should:
     * be a date field
-    * be less then 70 years and greater than 0
+    * be less than 70 full years and not in future
     """
 
-    def validate(self, value, valid_type_list=()):
-        super().validate(value)
+    # age depends on current date
+    cacheable = False
 
-        # check birthday
-        if value:
-            birthday_datetime = datetime.datetime.strptime(value, '%d.%m.%Y')
-            current_datetime = datetime.datetime.now()
-            age_in_years = (current_datetime - birthday_datetime).days / 365
-            is_birthday_valid = (0 <= age_in_years <= 70)
+    def validate_date(self, date):
 
-            if not is_birthday_valid:
-                raise ValueError(f"Incorrect birthday date, should be not greater than 70 "
-                                 f"and greater than 0: {age_in_years}")
+        # check birthday, age is a number of full years
+        today = getattr(_request_local, 'today', None) or datetime.date.today()
+        age_in_years = today.year - date.year - ((today.month, today.day) < (date.month, date.day))
+        is_birthday_valid = (0 <= age_in_years < 70)
+
+        if not is_birthday_valid:
+            raise ValueError(f"Incorrect birthday date, should be less than 70 "
+                             f"and not less than 0 full years: {age_in_years}")
 
 
 class GenderBaseField(BaseField):
@@ -395,63 +488,111 @@ def method_handler(request, context, store):
 
 
 class MainHTTPHandler(BaseHTTPRequestHandler):
+    # responses have Content-Length, so connections are kept alive between requests
+    protocol_version = "HTTP/1.1"
+    # idle keep-alive connections are closed after this number of seconds, so they don't hold threads forever
+    timeout = 5
     router = {
         "method": method_handler
     }
     store = None
 
     def get_request_id(self, headers):
-        return headers.get('HTTP_X_REQUEST_ID', uuid.uuid4().hex)
+        # random id is generated only if client didn't send one
+        return headers.get('HTTP_X_REQUEST_ID') or secrets.token_hex(16)
+
+    def read_body(self, length):
+        """
+        Read request body, too big bodies and negative Content-Length are rejected
+        """
+        if not 0 <= length <= MAX_BODY_SIZE:
+            raise ValueError(f"Incorrect Content-Length: {length}")
+
+        return self.rfile.read(length)
 
     def do_POST(self):
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
+        _request_local.today = datetime.date.today()
         request = None
         data_string = ''
 
         try:
-            data_string = self.rfile.read(int(self.headers['Content-Length']))
-            request = json.loads(data_string)
+            data_string = self.read_body(int(self.headers['Content-Length']))
+            request = json_loads(data_string)
         except:
             code = BAD_REQUEST
 
         if request:
             path = self.path.strip("/")
-            logging.info("%s: %s %s" % (self.path, data_string, context["request_id"]))
+            # messages are formatted by logging only if record is emitted, body is logged only in debug
+            logging.info("%s: %s", self.path, context["request_id"])
+            logging.debug("%s: %r %s", self.path, data_string, context["request_id"])
             if path in self.router:
                 try:
                     response, code = self.router[path]({"body": request, "headers": self.headers}, context, self.store)
                 except Exception as e:
-                    logging.exception("Unexpected error: %s" % e)
+                    logging.exception("Unexpected error: %s", e)
                     code = INTERNAL_ERROR
             else:
                 code = NOT_FOUND
 
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
         if code not in ERRORS:
             r = {"response": response, "code": code}
         else:
             r = {"error": response or ERRORS.get(code, "Unknown Error"), "code": code}
         context.update(r)
         logging.info(context)
-        self.wfile.write(json.dumps(r).encode())
+        body = json_dumps(r)
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if code == BAD_REQUEST:
+            # body may be not read completely, so rest of connection can't be parsed
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
         return
 
 
+def get_admin_digest():
+    """
+    Get admin token digest for current hour, it is recalculated only when hour changes
+    """
+    global _ADMIN_CACHE
+
+    # hour is compared as tuple, so strftime is called only when digest is recalculated
+    now = datetime.datetime.now()
+    hour = (now.year, now.month, now.day, now.hour)
+    cached_hour, digest = _ADMIN_CACHE
+    if cached_hour != hour:
+        h = hashlib.sha512(now.strftime("%Y%m%d%H").encode('utf-8'))
+        h.update(ADMIN_SALT_BYTES)
+        digest = h.digest()
+        _ADMIN_CACHE = (hour, digest)
+
+    return digest
+
+
 def check_auth(request):
 
     if request.is_admin():
-        msg = datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT
+        digest = get_admin_digest()
     else:
-        msg = request.account + request.login + SALT
+        # message parts are fed to hasher one by one without building joined string
+        h = hashlib.sha512((request.account or "").encode('utf-8'))
+        h.update(request.login.encode('utf-8'))
+        h.update(SALT_BYTES)
+        digest = h.digest()
 
-    digest = hashlib.sha512(msg.encode('utf-8')).hexdigest()
+    # raw digests are compared in constant time, token that is not hex is invalid
+    try:
+        token = bytes.fromhex(request.token)
+    except (TypeError, ValueError):
+        return False
 
-    if digest == request.token:
-        return True
-    return False
+    return hmac.compare_digest(digest, token)
 
 
 if __name__ == "__main__":
@@ -464,7 +605,7 @@ if __name__ == "__main__":
     logging.basicConfig(filename=args.log, level=logging.INFO,
                         format='[%(asctime)s] %(levelname).1s %(message)s', datefmt='%Y.%m.%d %H:%M:%S')
 
-    server = HTTPServer(("localhost", args.port), MainHTTPHandler)
+    server = ThreadingHTTPServer(("localhost", args.port), MainHTTPHandler)
     logging.info(f"Starting server at {args.port}")
 
     try:
@@ -1,3 +1,4 @@
+import io
 import hashlib
 import datetime
 import functools
@@ -44,6 +45,8 @@ class TestSuite(unittest.TestCase):
         {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "token": "", "arguments": {}},
         {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "token": "sdd", "arguments": {}},
         {"account": "horns&hoofs", "login": "admin", "method": "online_score", "token": "", "arguments": {}},
+        {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "token": "z" * 128, "arguments": {}},
+        {"account": "horns&hoofs", "login": "admin", "method": "online_score", "token": "я" * 128, "arguments": {}},
     ])
     def test_bad_auth(self, request):
         _, code = self.get_response(request)
@@ -66,10 +69,17 @@ class TestSuite(unittest.TestCase):
         {"phone": "79175002040"},
         {"phone": "89175002040", "email": "stupnikov@otus.ru"},
         {"phone": "79175002040", "email": "stupnikovotus.ru"},
+        {"phone": "79175002040", "email": "stupnikov@otus@ru"},
+        {"phone": "79175002040", "email": "stupnikov @otus.ru"},
+        {"phone": "7917500204a", "email": "stupnikov@otus.ru"},
+        {"phone": "7917500204٣", "email": "stupnikov@otus.ru"},
+        {"phone": "+7917500204", "email": "stupnikov@otus.ru"},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": -1},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": "1"},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1, "birthday": "01.01.1890"},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1, "birthday": "XXX"},
+        {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1,
+         "birthday": (datetime.date.today() - datetime.timedelta(days=70 * 365 + 20)).strftime("%d.%m.%Y")},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1, "birthday": "01.01.2000", "first_name": 1},
         {"phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1, "birthday": "01.01.2000",
          "first_name": "s", "last_name": 2},
@@ -140,6 +150,59 @@ class TestSuite(unittest.TestCase):
         self.assertTrue(all(v and isinstance(v, list) and all(isinstance(i, str) for i in v)
                         for v in response.values()))
 
+    @cases([-1, api.MAX_BODY_SIZE + 1])
+    def test_bad_body_length(self, length):
+        handler = api.MainHTTPHandler.__new__(api.MainHTTPHandler)
+        handler.rfile = io.BytesIO(b'{}')
+        with self.assertRaises(ValueError, msg=length):
+            handler.read_body(length)
+
+    def test_read_body(self):
+        handler = api.MainHTTPHandler.__new__(api.MainHTTPHandler)
+        handler.rfile = io.BytesIO(b'{"a": 1}')
+        self.assertEqual(handler.read_body(8), b'{"a": 1}')
+
+
+class TestValidationCache(unittest.TestCase):
+    def setUp(self):
+        api._validation_cache.clear()
+
+    @cases([
+        (api.PhoneBaseField(), "79175002040"),
+        (api.PhoneBaseField(), 79175002040),
+        (api.EmailField(), "stupnikovotus.ru"),
+        (api.GenderBaseField(), 1),
+    ])
+    def test_cache_hit(self, field, value):
+        result = field.is_valid(value)
+        key = field.get_cache_key(value)
+        self.assertIs(api._validation_cache.get(key), result, value)
+        self.assertIs(field.is_valid(value), result, value)
+
+    @cases([
+        (api.ClientIDsBaseField(), [1, 2]),
+        (api.CharBaseField(), "a" * (api.VALIDATION_CACHE_MAX_LENGTH + 1)),
+        (api.BirthDayField(), "01.01.2000"),
+    ])
+    def test_not_cached(self, field, value):
+        field.is_valid(value)
+        self.assertIsNone(field.get_cache_key(value), value)
+        self.assertFalse(api._validation_cache, value)
+
+    @cases([
+        (api.ClientIDsBaseField(), [1], [1.0]),
+        (api.PhoneBaseField(), 1, True),
+        (api.GenderBaseField(), 1, 1.0),
+    ])
+    def test_equal_values_of_different_types(self, field, value, other_value):
+        result = field.is_valid(value)
+        other_result = field.is_valid(other_value)
+        self.assertNotEqual(result, other_result, value)
+
+        # results of cached values are not mixed up
+        self.assertEqual(field.is_valid(value), result, value)
+        self.assertEqual(field.is_valid(other_value), other_result, other_value)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,12 +1,71 @@
+import math
+
 import numpy as np
 from scipy import sparse
+from scipy.special import expit
+
+# numba compiles the whole SGD loop into native code, use it when it is installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _sgd_loop(indptr, indices, data, y, w, all_batch_indices, learning_rate, reg, loss_history):
+    """
+    Run SGD over CSR matrix arrays in one loop, it does the same as LogisticRegression.loss
+    and weights update for every batch. w and loss_history are updated inplace.
+    """
+    num_iters, batch_size = all_batch_indices.shape
+    dim = w.shape[0]
+    dw = np.empty(dim)
+
+    for it in range(num_iters):
+        dw[:] = 0.0
+        loss = 0.0
+
+        for b in range(batch_size):
+            row = all_batch_indices[it, b]
+
+            z = 0.0
+            for k in range(indptr[row], indptr[row + 1]):
+                z += data[k] * w[indices[k]]
+
+            # exp of non-positive number never overflows, so loss and sigmoid stay finite under fastmath,
+            # cross-entropy is the same as in LogisticRegression.loss
+            exp_z = math.exp(-abs(z))
+            loss += max(z, 0.0) + math.log1p(exp_z) - y[row] * z
+
+            if z >= 0:
+                proba = 1.0 / (1.0 + exp_z)
+            else:
+                proba = exp_z / (1.0 + exp_z)
+            residual = proba - y[row]
+            for k in range(indptr[row], indptr[row + 1]):
+                dw[indices[k]] += data[k] * residual
+
+        # bias is the last weight and it is not regularized
+        reg_loss = 0.0
+        for j in range(dim - 1):
+            reg_loss += w[j] * w[j]
+            dw[j] += reg * w[j]
+
+        loss_history[it] = loss / batch_size + reg / (2 * batch_size) * reg_loss
+        for j in range(dim):
+            w[j] -= learning_rate * dw[j] / batch_size
+
+
+if njit is not None:
+    _sgd_loop = njit(fastmath=True, cache=True)(_sgd_loop)
 
 
 class LogisticRegression:
 
-    def __init__(self):
+    def __init__(self, seed=None):
         self.w = None
         self.loss_history = None
+        # own PCG64 generator instead of global RandomState, seed makes training reproducible
+        self.rng = np.random.default_rng(seed)
 
     def train(self, X, y, learning_rate=1e-3, reg=1e-5, num_iters=100,
               batch_size=200, verbose=False):
@@ -31,14 +90,30 @@ class LogisticRegression:
         num_train, dim = X.shape
         if self.w is None:
             # lazily initialize weights
-            self.w = np.random.randn(dim) * 0.01
+            self.w = self.rng.standard_normal(dim) * 0.01
+
+        # indices of all batches are sampled at once with replacement
+        all_batch_indices = self.rng.integers(0, num_train, size=(num_iters, batch_size), dtype=np.int32)
+
+        if njit is not None:
+            # whole loop runs in native code without sampling batches as sparse matrices
+            loss_history = np.empty(num_iters)
+            _sgd_loop(X.indptr, X.indices, X.data.astype(np.float64, copy=False),
+                      np.asarray(y, dtype=np.float64), self.w, all_batch_indices,
+                      learning_rate, reg, loss_history)
+            self.loss_history = loss_history.tolist()
+
+            if verbose:
+                for it in range(0, num_iters, 100):
+                    print('iteration %d / %d: loss %f' % (it, num_iters, self.loss_history[it]))
+            return
 
         # Run stochastic gradient descent to optimize W
         self.loss_history = []
         for it in range(num_iters):
 
             # subsample data for batch
-            batch_indices = np.random.choice(num_train, batch_size)
+            batch_indices = all_batch_indices[it]
             X_batch, y_batch = X[batch_indices, :], y[batch_indices]
 
             # evaluate loss and gradient
@@ -64,18 +139,28 @@ class LogisticRegression:
         - y_proba: Probabilities of classes for the data in X. y_pred is a 2-dimensional
           array with a shape (N, 2), and each row is a distribution of classes [prob_class_0, prob_class_1].
         """
-        if append_bias:
-            X = LogisticRegression.append_biases(X)
+        proba = self._predict_positive_proba(X, append_bias)
 
-        # predict probabilities
-        proba = self.sigmoid(X.dot(self.w.T))
-        y_proba = np.vstack((1 - proba, proba)).T
+        # fill both columns of C-contiguous array instead of stacking and transposing
+        y_proba = np.empty((proba.shape[0], 2), dtype=proba.dtype)
+        np.subtract(1.0, proba, out=y_proba[:, 0])
+        y_proba[:, 1] = proba
 
         return y_proba
 
+    def _predict_positive_proba(self, X, append_bias=False):
+        """
+        Predict probabilities of class 1 for data points, see predict_proba for inputs.
+        """
+        if append_bias:
+            X = LogisticRegression.append_biases(X)
+
+        scores = X.dot(self.w.T)
+        return self.sigmoid(scores, out=scores)
+
     def predict(self, X):
         """
-        Use the ```predict_proba``` method to predict labels for data points.
+        Use predicted probabilities of class 1 to predict labels for data points.
 
         Inputs:
         - X: N x D array of training data. Each column is a D-dimensional point.
@@ -86,8 +171,9 @@ class LogisticRegression:
           class.
         """
 
-        y_proba = self.predict_proba(X, append_bias=True)
-        y_pred = np.argmax(y_proba, axis=1)
+        # argmax of [1 - p, p] is 1 only when p > 0.5, so two columns are not needed
+        proba = self._predict_positive_proba(X, append_bias=True)
+        y_pred = (proba > 0.5).astype(np.intp)
         return y_pred
 
     def loss(self, X_batch, y_batch, reg):
@@ -102,15 +188,20 @@ class LogisticRegression:
         """
 
         num_train = X_batch.shape[0]
-        y_proba = self.sigmoid(X_batch.dot(self.w.T))
+        z = X_batch.dot(self.w.T)
+        y_proba = self.sigmoid(z)
 
-        loss = -np.dot(y_batch, np.log(y_proba)) - np.dot((1 - y_batch), np.log(1 - y_proba))
+        # cross-entropy written as log(1 + exp(z)) - y * z, that doesn't overflow for large |z|
+        loss = np.sum(np.maximum(z, 0) + np.log1p(np.exp(-np.abs(z)))) - np.dot(y_batch, z)
         loss = loss / num_train
         loss += (reg / (2 * num_train)) * np.dot(self.w[:-1], self.w[:-1])
 
-        dw = (y_proba - y_batch) * X_batch
-        dw = dw / num_train
-        dw[:-1] = dw[:-1] + (reg * self.w[:-1]) / num_train
+        # gradient is one sparse matrix-vector product, X_batch is never densified,
+        # residual is computed in y_proba buffer as it is not used anymore
+        residual = np.subtract(y_proba, y_batch, out=y_proba)
+        residual /= num_train
+        dw = np.asarray(X_batch.T.dot(residual)).ravel()
+        dw[:-1] += (reg * self.w[:-1]) / num_train
 
         return loss, dw
 
@@ -119,5 +210,6 @@ class LogisticRegression:
         return sparse.hstack((X, np.ones(X.shape[0])[:, np.newaxis])).tocsr()
 
     @staticmethod
-    def sigmoid(x):
-        return 1 / (1 + np.exp(-x))
+    def sigmoid(x, out=None):
+        # expit is a single C loop, out allows to reuse memory of x
+        return expit(x, out=out)